@@ -1,45 +1,89 @@
 #!/usr/bin/env python3
 """
-Load urls.py (dict: program -> year -> URL), sort by program and year,
-fetch each URL, run scrape_timetable.py, and write readable HTMLs.
-Usage: python run_from_urls.py [--urls urls.py] [--out dist]
-Requires: requests (pip install requests)
+Load urls.py (URL_ENTRIES, or dict URLS: program -> year -> URL), sorted by program and year,
+fetch all URLs concurrently, scrape them with scrape_timetable in a process pool,
+and write readable HTMLs.
+Pages unchanged since the last run (HTTP 304 via ETag / Last-Modified) are not re-scraped.
+Usage: python run_from_urls.py [--urls urls.py] [--out dist] [--no-cache]
+Requires: requests, lxml (pip install requests lxml)
 """
 
 import re
+import sys
 import html
-import subprocess
+import json
+import importlib
 import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.request import ACCEPT_ENCODING
+    from urllib3.util.retry import Retry
 except ImportError:
     raise SystemExit("Install requests: pip install requests")
 
+import scrape_timetable as st
+
 SCRIPT_DIR = Path(__file__).resolve().parent
 
+# url -> {"etag": ..., "last_modified": ...} from the last successful build of that URL
+HTTP_CACHE_PATH = SCRIPT_DIR / ".cache" / "http.json"
+
+# All URLs point at the same USOS host, so keep the number of parallel requests modest
+FETCH_WORKERS = 4
+
+_SLUG_RE = re.compile(r"[^\w\-]")
+
+# One session for all fetches so the TCP/TLS connection to USOS is kept alive and reused.
+# Ask for every compression urllib3 can decode here (gzip, deflate, plus br / zstd when available):
+# the pages are mostly HTML text and shrink several times on the wire.
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": "USOS-scraper/1.0",
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "Connection": "keep-alive",
+})
+_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=3, backoff_factor=0.3))
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+
 
+@functools.lru_cache(maxsize=256)
 def slug(s: str) -> str:
     """Safe filename segment from a label."""
-    return re.sub(r"[^\w\-]", "_", s.strip().lower()).strip("_") or "page"
+    return _SLUG_RE.sub("_", s.strip().lower()).strip("_") or "page"
 
 
 def load_urls_dict(path: Path) -> tuple[list[tuple[str, str, str]], str]:
     """
-    Load URLS from a Python module (dict: program -> year -> url).
-    Return (sorted list of (program, year, url), YEAR from module or "").
+    Load URL_ENTRIES (pre-sorted tuple of (program, year, url)) or URLS (dict: program -> year -> url)
+    from a Python module. Return (sorted list of (program, year, url), YEAR from module or "").
     """
-    import importlib.util
-    spec = importlib.util.spec_from_file_location("urls_module", path)
-    if spec is None or spec.loader is None:
-        raise SystemExit(f"Could not load {path}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
+    # Plain import from the file's directory, so the module's .pyc is cached like any other
+    sys.path.insert(0, str(path.parent))
+    try:
+        mod = importlib.import_module(path.stem)
+    except ImportError as e:
+        raise SystemExit(f"Could not load {path}: {e}")
+    finally:
+        sys.path.pop(0)
+    year_label = getattr(mod, "YEAR", "") or ""
+
+    url_entries = getattr(mod, "URL_ENTRIES", None)
+    if url_entries is not None:
+        # Already flat and sorted by the module
+        return [(program, year, url) for program, year, url in url_entries if url and isinstance(url, str)], year_label
+
     urls_map = getattr(mod, "URLS", None)
     if not isinstance(urls_map, dict):
-        raise SystemExit(f"{path} must define URLS = {{ program: {{ year: url, ... }}, ... }}")
-    year_label = getattr(mod, "YEAR", "") or ""
+        raise SystemExit(
+            f"{path} must define URL_ENTRIES = ((program, year, url), ...) "
+            f"or URLS = {{ program: {{ year: url, ... }}, ... }}"
+        )
 
     entries = []
     for program, years in urls_map.items():
@@ -57,52 +101,130 @@ def output_filename(program: str, year: str) -> str:
     return f"{slug(program)}_{slug(year)}.html"
 
 
-def fetch_and_build(
-    url: str,
-    output_path: Path,
-    template_path: Path,
-    *,
-    plan_title: str = "Plan Zajęć",
-) -> bool:
-    """Download URL to a temp file, run scrape_timetable, write to output_path. Return True on success."""
+def load_http_cache() -> dict:
+    """Load the ETag / Last-Modified cache, or {} if there is none (or it is unreadable)."""
     try:
-        r = requests.get(url, timeout=30, headers={"User-Agent": "USOS-scraper/1.0"})
+        return json.loads(HTTP_CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_http_cache(cache: dict) -> None:
+    HTTP_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    HTTP_CACHE_PATH.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def conditional_headers(cached: dict | None, output_path: Path, template_path: Path) -> dict:
+    """
+    If-None-Match / If-Modified-Since headers for a previously built URL, or {} when a 304 could not
+    be used anyway (no cache entry, output missing, or output older than the template).
+    """
+    if not cached or not output_path.is_file():
+        return {}
+    if output_path.stat().st_mtime < template_path.stat().st_mtime:
+        return {}
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+
+def fetch(url: str, headers: dict | None = None) -> requests.Response | None:
+    """Download URL (200, or 304 for a conditional request) and return the response, or None on failure."""
+    try:
+        r = SESSION.get(url, timeout=30, headers=headers)
         r.raise_for_status()
     except requests.RequestException as e:
         print(f"  Fetch failed: {e}")
-        return False
+        return None
+    return r
+
+
+def _scrape_and_write(page_html: str, output_path: Path, template_path: Path, plan_title: str) -> int:
+    """Process-pool worker: scrape page_html and write the readable timetable. Return number of events."""
+    events = st.scrape_timetable_from_str(page_html)
+    st.generate_readable_html(events, template_path, output_path, plan_title=plan_title)
+    return len(events["day"])
 
-    tmp = SCRIPT_DIR / ".tmp_timetable.html"
-    tmp.write_text(r.text, encoding="utf-8")
-    try:
-        subprocess.run(
-            [
-                "python",
-                str(SCRIPT_DIR / "scrape_timetable.py"),
-                str(tmp),
-                "--template",
-                str(template_path),
-                "-o",
-                str(output_path),
-                "--title",
-                plan_title,
-            ],
-            check=True,
-            cwd=str(SCRIPT_DIR),
-        )
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"  Scrape failed: {e}")
-        return False
-    finally:
-        if tmp.exists():
-            tmp.unlink()
+
+def build_all(
+    entries: list[tuple[str, str, str]],
+    out_dir: Path,
+    template_path: Path,
+    *,
+    use_cache: bool = True,
+) -> list[tuple[str, str, str]]:
+    """
+    Fetch all entries concurrently and hand each page to a process pool for scraping as soon as
+    it arrives; pages answered with 304 Not Modified keep their existing output.
+    Return (program, year, filename) for every timetable built or kept, in entries order.
+    """
+    cache = load_http_cache()
+    builds = {}  # entry index -> future of _scrape_and_write
+    validators = {}  # entry index -> cache entry to store once its build succeeds
+    unchanged = set()  # entry indexes answered with 304
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as fetch_pool, ProcessPoolExecutor() as build_pool:
+        fetches = {}
+        for i, (program, year, url) in enumerate(entries):
+            output_path = out_dir / output_filename(program, year)
+            headers = conditional_headers(cache.get(url), output_path, template_path) if use_cache else {}
+            fetches[fetch_pool.submit(fetch, url, headers)] = i
+        for future in as_completed(fetches):
+            r = future.result()
+            if r is None:
+                continue
+            i = fetches[future]
+            if r.status_code == 304:
+                unchanged.add(i)
+                continue
+            program, year, _ = entries[i]
+            validators[i] = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+            builds[i] = build_pool.submit(
+                _scrape_and_write,
+                r.text,
+                out_dir / output_filename(program, year),
+                template_path,
+                f"{program} – {year}",
+            )
+
+        built = []
+        for i, (program, year, url) in enumerate(entries):
+            name = output_filename(program, year)
+            print(f"  {program} / {year} -> {name}")
+            if i in unchanged:
+                print("  Not modified, keeping existing file")
+                built.append((program, year, name))
+                continue
+            if i not in builds:
+                continue
+            try:
+                n_events = builds[i].result()
+            except Exception as e:  # one broken page must not stop the whole batch
+                print(f"  Scrape failed: {e}")
+                cache.pop(url, None)
+                continue
+            print(f"  Scraped {n_events} events")
+            built.append((program, year, name))
+            if any(validators[i].values()):
+                cache[url] = validators[i]
+            else:
+                cache.pop(url, None)
+
+    save_http_cache(cache)
+    return built
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Scrape timetables from urls.py (program -> year -> URL)")
     parser.add_argument("--urls", default="urls.py", help="Path to urls.py (default: urls.py)")
     parser.add_argument("--out", default="dist", help="Output directory for HTML files (default: dist)")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached ETag / Last-Modified values and re-scrape every page",
+    )
     args = parser.parse_args()
 
     base = SCRIPT_DIR
@@ -118,21 +240,13 @@ def main() -> None:
     entries, year_label = load_urls_dict(urls_path)
     out_dir.mkdir(parents=True, exist_ok=True)
     if not entries:
-        print("No URLs in urls.py (URLS dict empty or no valid program/year/url entries).")
+        print("No URLs in urls.py (URL_ENTRIES / URLS empty or no valid program/year/url entries).")
         (out_dir / "index.html").write_text(
-            "<!DOCTYPE html><html><body><p>Add timetable URLs to <code>urls.py</code> URLS and re-run.</p></body></html>",
+            "<!DOCTYPE html><html><body><p>Add timetable URLs to <code>urls.py</code> (PLANS / URLS) and re-run.</p></body></html>",
             encoding="utf-8",
         )
         return
-    ok = 0
-    built = []  # (program, year, filename) for index
-    for program, year, url in entries:
-        name = output_filename(program, year)
-        output_path = out_dir / name
-        print(f"  {program} / {year} -> {output_path.name}")
-        if fetch_and_build(url, output_path, template_path, plan_title=f"{program} – {year}"):
-            ok += 1
-            built.append((program, year, name))
+    built = build_all(entries, out_dir, template_path, use_cache=not args.no_cache)
 
     year_escaped = html.escape(year_label)
     year_line = f'    <p class="year">Rok akademicki: {year_escaped}</p>\n' if year_label else ""
@@ -165,7 +279,7 @@ def main() -> None:
 </html>
 """
     (out_dir / "index.html").write_text(index_html, encoding="utf-8")
-    print(f"Built {ok}/{len(entries)} timetables in {out_dir}; wrote index.html")
+    print(f"Built {len(built)}/{len(entries)} timetables in {out_dir}; wrote index.html")
 
 
 if __name__ == "__main__":
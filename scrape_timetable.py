@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
 """
 Scrape USOS timetable.html and generate a readable HTML schedule (fix13-style).
-Usage: python scrape_timetable.py [timetable.html] [--output readable.html]
-Requires: beautifulsoup4 (install with: uv add beautifulsoup4  or  pip install beautifulsoup4)
+Usage: python scrape_timetable.py [timetable.html | -] [--output readable.html]
+Requires: lxml (install with: uv add lxml  or  pip install lxml)
 """
 
 import re
+import sys
 import html
 import json
 import argparse
+import functools
 from pathlib import Path
 
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
 
 
 # Default palette for subject colors (when metaData is auto-generated)
@@ -21,23 +24,62 @@ SUBJECT_COLORS = [
     "#f8bbd0", "#cfd8dc",
 ]
 
+_TIMETABLE_CLOSE = "</usos-timetable>"
+
+# Compiled XPath queries, evaluated in C once per day / entry
+_TIMETABLE_XP = etree.XPath("//usos-timetable")
+_DAY_XP = etree.XPath(".//timetable-day")
+_H4_XP = etree.XPath(".//h4")
+_ENTRY_XP = etree.XPath(".//timetable-entry")
+_INFO_XP = etree.XPath('string(.//div[@slot="info"])', smart_strings=False)
+_TIME_SPAN_XP = etree.XPath('.//span[@slot="time"]')
+_DIALOG_EVENT_XP = etree.XPath('.//span[@slot="dialog-event"]')
+
+# Fields of a scraped event (one column each), in the order they are written to rawData
+_EVENT_KEYS = ("day", "start", "end", "subject", "type", "group", "room")
+
+# Data blocks in the template that get replaced with scraped rawData / metaData
+_RAW_RE = re.compile(r"const rawData = \[\s*[\s\S]*?\n\s*\];", re.MULTILINE)
+_META_RE = re.compile(r"const metaData = \{\s*[\s\S]*?\n\s*\};", re.MULTILINE)
+_TITLE_RE = re.compile(r"__PLAN_TITLE__")
+
+# Slots between the static template segments, filled in by generate_readable_html
+_TITLE, _RAW, _META, _END = "title", "raw", "meta", ""
+
+_GRID_RE = re.compile(r"g(\d{4})")
+# Parts of the info slot, e.g. "CWL, gr. 1 (012, bud. B9)"
+_GR_RE = re.compile(r"\bgr\.\s*(\d+)", re.IGNORECASE)
+_ROOM_RE = re.compile(r"\(\s*([^)]+)\s*\)")
+# Fallback time range from the dialog-event text, e.g. "8:00 — 9:30"
+_TIMERANGE_RE = re.compile(r"(\d{1,2}:\d{2})\s*[—\-]\s*(\d{1,2}:\d{2})")
+
 
 def grid_time_to_str(g: str) -> str:
     """Convert grid token like 'g0800' or 'g0945' to '08:00' or '09:45'."""
-    m = re.match(r"g(\d{4})", g.strip())
+    m = _GRID_RE.match(g.strip())
     if not m:
         return ""
     hh, mm = m.group(1)[:2], m.group(1)[2:]
     return f"{hh}:{mm}"
 
 
+def _style_time(style: str, key: str) -> str:
+    """Return 'HH:MM' for the grid token following key in style (e.g. 'grid-row-start: g0800'), or ''."""
+    i = style.find(key)
+    if i < 0:
+        return ""
+    token = style[i + len(key) : i + len(key) + 16].lstrip()
+    hhmm = token[1:5]
+    if token[:1] != "g" or len(hhmm) != 4 or not hhmm.isdigit():
+        return ""
+    return f"{hhmm[:2]}:{hhmm[2:]}"
+
+
 def parse_style_times(style: str) -> tuple[str, str]:
-    """Extract start and end time from timetable-entry style."""
-    start_match = re.search(r"grid-row-start:\s*(g\d{4})", style or "")
-    end_match = re.search(r"grid-row-end:\s*(g\d{4})", style or "")
-    start = grid_time_to_str(start_match.group(1)) if start_match else ""
-    end = grid_time_to_str(end_match.group(1)) if end_match else ""
-    return start, end
+    """Extract start and end time from timetable-entry style, e.g. 'grid-row-start: g0800; grid-row-end: g0945'."""
+    if not style:
+        return "", ""
+    return _style_time(style, "grid-row-start:"), _style_time(style, "grid-row-end:")
 
 
 def parse_info_slot(info_text: str) -> tuple[str, str, str]:
@@ -50,80 +92,105 @@ def parse_info_slot(info_text: str) -> tuple[str, str, str]:
     # Normalize &nbsp; and strip
     text = info_text.replace("\xa0", " ").strip()
     # Type: first part before "gr." (e.g. "CWL" or "W")
-    gr_match = re.search(r"\bgr\.\s*(\d+)", text, re.IGNORECASE)
+    gr_match = _GR_RE.search(text)
     group = gr_match.group(1) if gr_match else ""
     # Type is everything before "gr."
     type_part = text[: gr_match.start()].strip().rstrip(",").strip() if gr_match else text.split(",")[0].strip()
     # Room: content in parentheses (e.g. "012, bud. B9" or "on-line, bud. A0")
-    room_match = re.search(r"\(\s*([^)]+)\s*\)", text)
+    room_match = _ROOM_RE.search(text)
     room = room_match.group(1).strip() if room_match else ""
     return type_part, group, room
 
 
 def extract_lecturers(dialog_person_slot) -> str:
     """Extract lecturer names from dialog-person div (text of links, comma-separated)."""
-    if not dialog_person_slot:
+    if dialog_person_slot is None:
         return ""
-    links = dialog_person_slot.find_all("a")
-    names = [a.get_text(strip=True).rstrip(",") for a in links if a.get_text(strip=True)]
+    names = [t.strip().rstrip(",") for t in dialog_person_slot.xpath(".//a/text()") if t.strip()]
     return ", ".join(names) if names else ""
 
 
-def scrape_timetable(html_path: Path) -> list[dict]:
-    """Parse USOS timetable HTML and return list of events as dicts."""
-    soup = BeautifulSoup(html_path.read_text(encoding="utf-8"), "html.parser")
+def scrape_timetable(html_path: Path) -> dict[str, list[str]]:
+    """Parse USOS timetable HTML file and return events as columns (see scrape_timetable_from_str)."""
+    return scrape_timetable_from_str(html_path.read_text(encoding="utf-8"))
+
+
+def _fallback_times(entry, start: str, end: str) -> tuple[str, str]:
+    """Take times from the entry's time / dialog-event spans when its style has no grid tokens."""
+    time_span = _TIME_SPAN_XP(entry)
+    dialog_ev = _DIALOG_EVENT_XP(entry)
+    if time_span:
+        start = time_span[0].text_content().strip()
+    if dialog_ev:
+        text = dialog_ev[0].text_content().strip()
+        m = _TIMERANGE_RE.search(text)
+        if m:
+            start, end = m.group(1), m.group(2)
+            if len(start) == 4:
+                start = "0" + start
+            if len(end) == 4:
+                end = "0" + end
+    return start, end
+
 
-    timetable = soup.find("usos-timetable") or soup
-    day_blocks = timetable.find_all("timetable-day", recursive=True)
+def scrape_timetable_from_str(html_text: str) -> dict[str, list[str]]:
+    """
+    Parse USOS timetable HTML text and return events as columns: one list per field in _EVENT_KEYS
+    ("day", "start", ...), all of the same length; event i is the i-th value of every column.
+    """
+    events = {k: [] for k in _EVENT_KEYS}
+    if not html_text.strip():
+        return events
+    # Only <usos-timetable> is needed: parse just that slice instead of the whole page
+    cut = html_text.find("<usos-timetable")
+    if cut >= 0:
+        cut_end = html_text.find(_TIMETABLE_CLOSE, cut)
+        if cut_end >= 0:
+            html_text = html_text[cut : cut_end + len(_TIMETABLE_CLOSE)]
+    doc = lxml_html.fromstring(html_text)
+
+    timetable = (_TIMETABLE_XP(doc) or [doc])[0]
     day_names = ["Poniedziałek", "Wtorek", "Środa", "Czwartek", "Piątek"]
-    events = []
+    day_col, start_col, end_col, subject_col, type_col, group_col, room_col = (events[k] for k in _EVENT_KEYS)
 
-    for i, td in enumerate(day_blocks):
-        parent = td.parent
+    for i, td in enumerate(_DAY_XP(timetable)):
+        parent = td.getparent()
         day_name = day_names[i] if i < len(day_names) else f"Day {i+1}"
-        if parent:
-            h4 = parent.find("h4")
+        if parent is not None:
+            h4 = _H4_XP(parent)
             if h4:
-                day_name = h4.get_text(strip=True)
+                day_name = h4[0].text_content().strip()
 
-        for entry in td.find_all("timetable-entry"):
-            style = entry.get("style") or ""
+        # Extract each field for the whole day column by column
+        entries = _ENTRY_XP(td)
+        styles = [e.get("style") or "" for e in entries]
+        infos = [_INFO_XP(e) for e in entries]
+        day_col.extend([day_name] * len(entries))
+        subject_col.extend((e.get("name") or "").strip() for e in entries)
+
+        for entry, style, info_text in zip(entries, styles, infos):
             start, end = parse_style_times(style)
             if not start or not end:
-                time_span = entry.find("span", {"slot": "time"})
-                dialog_ev = entry.find("span", {"slot": "dialog-event"})
-                if time_span:
-                    start = time_span.get_text(strip=True)
-                if dialog_ev:
-                    text = dialog_ev.get_text(strip=True)
-                    m = re.search(r"(\d{1,2}:\d{2})\s*[—\-]\s*(\d{1,2}:\d{2})", text)
-                    if m:
-                        start, end = m.group(1), m.group(2)
-                        if len(start) == 4:
-                            start = "0" + start
-                        if len(end) == 4:
-                            end = "0" + end
-            subject = (entry.get("name") or "").strip()
-            info_div = entry.find("div", {"slot": "info"})
-            info_text = info_div.get_text() if info_div else ""
+                start, end = _fallback_times(entry, start, end)
             type_abbrev, group, room = parse_info_slot(info_text)
-
-            events.append({
-                "day": day_name,
-                "start": start,
-                "end": end,
-                "subject": subject,
-                "type": type_abbrev,
-                "group": group,
-                "room": room,
-            })
+            start_col.append(start)
+            end_col.append(end)
+            type_col.append(type_abbrev)
+            group_col.append(group)
+            room_col.append(room)
 
     return events
 
 
-def build_meta_data(events: list[dict]) -> dict:
-    """Build metaData object for each subject (short name, color)."""
-    subjects = list({e["subject"] for e in events if e["subject"]})
+def events_to_records(events: dict[str, list[str]]) -> list[dict]:
+    """Turn event columns into a list of per-event dicts (e.g. for JSON output)."""
+    return [dict(zip(_EVENT_KEYS, row)) for row in zip(*(events[k] for k in _EVENT_KEYS))]
+
+
+def _subjects_meta(subjects) -> dict:
+    """Build metaData entries (short name, color) for an iterable of distinct subject names."""
+    colors = SUBJECT_COLORS
+    n_colors = len(colors)
     meta = {}
     for i, subj in enumerate(sorted(subjects)):
         short = subj if len(subj) <= 20 else subj[:17] + "..."
@@ -132,21 +199,20 @@ def build_meta_data(events: list[dict]) -> dict:
             "status": "?",
             "verify": "?",
             "short": short,
-            "color": SUBJECT_COLORS[i % len(SUBJECT_COLORS)],
+            "color": colors[i % n_colors],
         }
     return meta
 
 
-def raw_data_to_js(events: list[dict]) -> str:
-    """Format events as JavaScript array of objects for rawData."""
-    lines = []
-    for e in events:
-        line = (
-            f'            {{ day: "{e["day"]}", start: "{e["start"]}", end: "{e["end"]}", '
-            f'subject: "{e["subject"].replace(chr(34), chr(92)+chr(34))}", '
-            f'type: "{e["type"]}", group: "{e["group"]}", room: "{e["room"].replace(chr(34), chr(92)+chr(34))}" }},'
-        )
-        lines.append(line)
+def build_meta_data(events: dict[str, list[str]]) -> dict:
+    """Build metaData object for each subject (short name, color)."""
+    return _subjects_meta(set(events["subject"]) - {""})
+
+
+def raw_data_to_js(events: dict[str, list[str]]) -> str:
+    """Format event columns as JavaScript array of objects for rawData."""
+    rows = zip(*(events[k] for k in _EVENT_KEYS))
+    lines = [f"            {json.dumps(dict(zip(_EVENT_KEYS, row)), ensure_ascii=False)}," for row in rows]
     return "\n".join(lines) if lines else "            // no events"
 
 
@@ -162,8 +228,41 @@ def meta_data_to_js(meta: dict) -> str:
     return "\n".join(lines) if lines else "            // no meta"
 
 
+@functools.lru_cache(maxsize=4)
+def _load_template(path_str: str) -> tuple[tuple[tuple[bytes, str], ...], bytes]:
+    """
+    Read template once and split it at the plan title and the rawData / metaData blocks.
+    Returns (segments, meta_block): segments are (static_text, slot) pairs where slot says what
+    follows the text (_TITLE, _RAW, _META, or _END for the last one); meta_block is the template's
+    own metaData block, kept for when it is not replaced. Text is pre-encoded as UTF-8.
+    """
+    template = Path(path_str).read_text(encoding="utf-8")
+    blocks = []
+    meta_block = b""
+    raw = _RAW_RE.search(template)
+    if raw:
+        blocks.append((raw.start(), raw.end(), _RAW))
+        meta = _META_RE.search(template, raw.end())
+        if meta:
+            blocks.append((meta.start(), meta.end(), _META))
+            meta_block = meta.group().encode("utf-8")
+    titles = [
+        (m.start(), m.end(), _TITLE)
+        for m in _TITLE_RE.finditer(template)
+        if not any(start <= m.start() < end for start, end, _ in blocks)
+    ]
+
+    segments = []
+    pos = 0
+    for start, end, slot in sorted(blocks + titles):
+        segments.append((template[pos:start].encode("utf-8"), slot))
+        pos = end
+    segments.append((template[pos:].encode("utf-8"), _END))
+    return tuple(segments), meta_block
+
+
 def generate_readable_html(
-    events: list[dict],
+    events: dict[str, list[str]],
     template_path: Path,
     output_path: Path,
     *,
@@ -171,31 +270,20 @@ def generate_readable_html(
     plan_title: str = "Plan Zajęć",
 ) -> None:
     """Generate readable HTML from fix13 template with scraped rawData (and optional metaData)."""
-    template = template_path.read_text(encoding="utf-8")
-
-    template = template.replace("__PLAN_TITLE__", html.escape(plan_title))
+    segments, meta_block = _load_template(str(template_path))
 
     raw_js = raw_data_to_js(events)
-    raw_pattern = re.compile(
-        r"const rawData = \[\s*[\s\S]*?\n\s*\];",
-        re.MULTILINE,
-    )
-    template = raw_pattern.sub(lambda _: f"const rawData = [\n{raw_js}\n        ];", template, count=1)
-
     if inject_meta:
-        meta = build_meta_data(events)
-        meta_js = meta_data_to_js(meta)
-        meta_pattern = re.compile(
-            r"const metaData = \{\s*[\s\S]*?\n\s*\};",
-            re.MULTILINE,
-        )
-        template = meta_pattern.sub(
-            lambda _: f"const metaData = {{\n{meta_js}\n        }};",
-            template,
-            count=1,
-        )
+        meta_js = meta_data_to_js(build_meta_data(events))
+        meta_block = f"const metaData = {{\n{meta_js}\n        }};".encode("utf-8")
+    fill = {
+        _TITLE: html.escape(plan_title).encode("utf-8"),
+        _RAW: f"const rawData = [\n{raw_js}\n        ];".encode("utf-8"),
+        _META: meta_block,
+        _END: b"",
+    }
 
-    output_path.write_text(template, encoding="utf-8")
+    output_path.write_bytes(b"".join([part for text, slot in segments for part in (text, fill[slot])]))
 
 
 def main() -> None:
@@ -204,7 +292,7 @@ def main() -> None:
         "input",
         nargs="?",
         default="timetable.html",
-        help="Path to timetable.html (default: timetable.html)",
+        help="Path to timetable.html, or - to read it from stdin (default: timetable.html)",
     )
     parser.add_argument(
         "-o", "--output",
@@ -229,22 +317,25 @@ def main() -> None:
     args = parser.parse_args()
 
     base = Path(__file__).resolve().parent
-    input_path = base / args.input
+    input_path = None if args.input == "-" else base / args.input
     template_path = base / args.template
     output_path = base / args.output
 
-    if not input_path.is_file():
+    if input_path is not None and not input_path.is_file():
         raise SystemExit(f"Input file not found: {input_path}")
     if not template_path.is_file():
         raise SystemExit(f"Template file not found: {template_path}")
 
-    events = scrape_timetable(input_path)
-    print(f"Scraped {len(events)} events from {input_path}")
+    if input_path is None:
+        events = scrape_timetable_from_str(sys.stdin.buffer.read().decode("utf-8"))
+    else:
+        events = scrape_timetable(input_path)
+    print(f"Scraped {len(events['day'])} events from {input_path or 'stdin'}")
 
     if args.json:
         json_path = output_path.with_suffix(".json")
         json_path.write_text(
-            json.dumps(events, ensure_ascii=False, indent=2),
+            json.dumps(events_to_records(events), ensure_ascii=False, indent=2),
             encoding="utf-8",
         )
         print(f"Wrote {json_path}")
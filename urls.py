@@ -3,10 +3,14 @@ BASE = "https://web.usos.agh.edu.pl/kontroler.php?_action=katalog2/przedmioty/po
 YEAR = "25/26"
 
 
+# cdyd_kod for each term of YEAR, e.g. "25%2F26-Z"
+_YEAR_ENC = YEAR.replace("/", "%2F")
+_CDYD = {term: f"{_YEAR_ENC}-{term}" for term in ("Z", "L")}
+
+
 def plan_url(prefix: str, grupa_part: str, term: str = "Z") -> str:
     """Build plan URL from prefix (e.g. 230-TEI), group part (e.g. 1S_sem1) and term (Z or L)."""
-    cdyd = YEAR.replace("/", "%2F") + "-" + term
-    return f"{BASE}&grupa_kod={prefix}{grupa_part}&cdyd_kod={cdyd}"
+    return f"{BASE}&grupa_kod={prefix}{grupa_part}&cdyd_kod={_CDYD[term]}"
 
 
 PLANS = {
@@ -43,10 +47,14 @@ PLANS = {
     }
 }
 
-URLS = {
-    program: {
-        label: plan_url(data["prefix"], part, term)
-        for label, (part, term) in (x for x in data.items() if x[0] != "prefix")
-    }
-    for program, data in PLANS.items()
-}
+# Flat (program, label, url) entries, pre-sorted by program and label (case-insensitive)
+URL_ENTRIES = tuple(
+    sorted(
+        (
+            (program, label, plan_url(data["prefix"], part, term))
+            for program, data in PLANS.items()
+            for label, (part, term) in (x for x in data.items() if x[0] != "prefix")
+        ),
+        key=lambda e: (e[0].lower(), e[1].lower()),
+    )
+)